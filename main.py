@@ -1,37 +1,112 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Form, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from fastapi.dependencies import utils as dependency_utils
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+import jwt
+from jwt import InvalidTokenError as JWTError
 from passlib.context import CryptContext
+from pydantic import TypeAdapter
+from jinja2 import FileSystemBytecodeCache
+from cachetools import TTLCache
 import database, models, schemas
+import functools
+import hashlib
 import os
-import pytz
+import threading
+import time
+from zoneinfo import ZoneInfo
 
-models.Base.metadata.create_all(bind=database.engine)
+
+def _cache_call_check(check):
+    cached_check = functools.lru_cache(maxsize=None)(check)
+
+    @functools.wraps(check)
+    def wrapper(call):
+        try:
+            return cached_check(call)
+        except TypeError:
+            return check(call)
+
+    return wrapper
+
+
+# FastAPI проверяет тип каждой зависимости через inspect на каждом запросе,
+# хотя набор зависимостей фиксирован - кэшируем результат по самому callable
+for _check_name in ("is_coroutine_callable", "is_gen_callable", "is_async_gen_callable"):
+    setattr(dependency_utils, _check_name, _cache_call_check(getattr(dependency_utils, _check_name)))
 
 app = FastAPI(
     title="Warehouse Inventory System",
     description="Система управления складскими запасами - Остатки, поставки, инвентаризации",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 if not os.path.exists("templates"):
     os.makedirs("templates")
-templates = Jinja2Templates(directory="templates")
+if not os.path.exists(".jinja_cache"):
+    os.makedirs(".jinja_cache")
+templates = Jinja2Templates(
+    directory="templates",
+    bytecode_cache=FileSystemBytecodeCache(".jinja_cache"),
+    auto_reload=False
+)
 
-moscow_tz = pytz.timezone('Europe/Moscow')
+MSK = ZoneInfo('Europe/Moscow')
 
 SECRET_KEY = "warehouse-secret-key-2024-course-project"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+_ALGS = [ALGORITHM]
+_EXPIRE_DELTA = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=10)
 security_scheme = HTTPBearer()
 
+_REDIRECT_REGISTER_SHORT_PASSWORD = "/register-page?error=Password+must+be+at+least+6+characters"
+_REDIRECT_REGISTER_EMAIL_TAKEN = "/register-page?error=Email+already+registered"
+_REDIRECT_REGISTER_OK = "/login-page?success=Registration+successful"
+_REDIRECT_REGISTER_FAILED = "/register-page?error=Registration+failed+try+again"
+_REDIRECT_LOGIN_FAILED = "/login-page?error=Invalid+credentials"
+_REDIRECT_LOGIN_OK = "/?success=Login+successful"
+_REDIRECT_HOME = "/"
+_REDIRECT_PRODUCT_SKU_EXISTS = "/products-page?error=SKU+already+exists"
+_REDIRECT_PRODUCT_CREATED = "/products-page?success=Product+created"
+_REDIRECT_PRODUCT_DELETED = "/products-page?success=Product+deleted"
+_REDIRECT_PRODUCT_NOT_FOUND = "/products-page?error=Product+not+found"
+_REDIRECT_SUPPLY_PRODUCT_NOT_FOUND = "/supplies-page?error=Product+not+found"
+_REDIRECT_SUPPLY_CREATED = "/supplies-page?success=Supply+created"
+_REDIRECT_SUPPLY_NOT_FOUND = "/supplies-page?error=Поставка+не+найдена"
+_REDIRECT_SUPPLY_DELETED = "/supplies-page?success=Поставка+удалена"
+_REDIRECT_INVENTORY_CREATED = "/inventories-page?success=Инвентаризация+создана"
+_REDIRECT_INVENTORY_NOT_FOUND_RU = "/inventories-page?error=Инвентаризация+не+найдена"
+_REDIRECT_INVENTORY_UPDATED = "/inventories-page?success=Инвентаризация+обновлена"
+_REDIRECT_INVENTORY_NOT_FOUND = "/inventories-page?error=Inventory+not+found"
+_REDIRECT_INVENTORY_INVALID_STATUS = "/inventories-page?error=Invalid+status"
+_REDIRECT_INVENTORY_STATUS_UPDATED = "/inventories-page?success=Status+updated"
+_REDIRECT_INVENTORY_DELETED = "/inventories-page?success=Inventory+deleted"
+
+_ACCESS_TOKEN_COOKIE = {"key": "access_token", "httponly": True, "samesite": "lax"}
+_BEARER_HEADERS = {"WWW-Authenticate": "Bearer"}
+_LOGIN_REDIRECT_HEADERS = {"Location": "/login-page"}
+
+ProductAdapter = TypeAdapter(schemas.Product)
+ProductListAdapter = TypeAdapter(List[schemas.Product])
+SupplyListAdapter = TypeAdapter(List[schemas.Supply])
+InventoryListAdapter = TypeAdapter(List[schemas.Inventory])
+
+# Декодированные JWT-токены, чтобы не проверять подпись на каждый запрос
+_jwt_cache = TTLCache(maxsize=10_000, ttl=30)
+# Соответствие токен -> (user_id, email), чтобы искать пользователя по первичному ключу
+_token_user_cache = TTLCache(maxsize=5000, ttl=60)
+# Готовые JSON-ответы списочных API по ключу (раздел, user_id, skip, limit); сбрасываются при изменениях
+_list_cache = TTLCache(maxsize=1000, ttl=10)
+_list_cache_lock = threading.Lock()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -43,7 +118,48 @@ def get_password_hash(password: str) -> str:
 
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+    return db.scalar(select(models.User).where(models.User.email == email))
+
+
+def get_owned_object(db: Session, model, object_id: int, user_id: int):
+    obj = db.get(model, object_id)
+    if obj is None or obj.user_id != user_id:
+        return None
+    return obj
+
+
+# Исключение создается заново на каждый raise: общий экземпляр копил бы __traceback__
+def auth_error(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers=_BEARER_HEADERS)
+
+
+def not_found(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+
+def cached_user_list(section: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            key = (section, kwargs["current_user"].id, kwargs["skip"], kwargs["limit"])
+            with _list_cache_lock:
+                body = _list_cache.get(key)
+            if body is None:
+                body = func(**kwargs).body
+                with _list_cache_lock:
+                    _list_cache[key] = body
+            return Response(content=body, media_type=ORJSONResponse.media_type)
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_user_lists(user_id: int, *sections: str):
+    with _list_cache_lock:
+        for key in list(_list_cache):
+            if key[0] in sections and key[1] == user_id:
+                _list_cache.pop(key, None)
 
 
 def authenticate_user(db: Session, email: str, password: str):
@@ -58,55 +174,87 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + _EXPIRE_DELTA
     to_encode.update({"exp": expire, "sub": data["sub"]})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def _decode_token(token: str) -> dict:
+    payload = _jwt_cache.get(token)
+    if payload is not None and payload["exp"] > time.time():
+        return payload
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=_ALGS)
+    if payload.get("exp", 0) > time.time():
+        _jwt_cache[token] = payload
+    return payload
+
+
+def _get_user_for_token(db: Session, token: str, email: str):
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_user_cache.get(key)
+    if cached is not None:
+        user_id, cached_email = cached
+        user = db.get(models.User, user_id)
+        if user is not None and user.email == cached_email:
+            return user
+
+    user = get_user_by_email(db, email)
+    if user is not None:
+        _token_user_cache[key] = (user.id, user.email)
+    return user
+
 
 async def get_current_user_for_api(
         request: Request,
         credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_scheme),
         db: Session = Depends(database.get_db)
 ):
+    user = getattr(request.state, "user", None)
+    if user:
+        return user
+
     if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise auth_error("Not authenticated")
 
     token = credentials.credentials
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
         email: str = payload.get("sub")
         if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+            raise auth_error("Invalid token")
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        raise auth_error("Invalid token")
 
-    user = get_user_by_email(db, email)
+    user = _get_user_for_token(db, token, email)
     if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+        raise auth_error("User not found")
+    request.state.user = user
     return user
 
 
 async def get_current_user_for_web(request: Request, db: Session = Depends(database.get_db)):
+    user = getattr(request.state, "user", None)
+    if user:
+        return user
+
     token = request.cookies.get("access_token")
     if not token:
         return None
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
         email: str = payload.get("sub")
         if email is None:
             return None
     except JWTError:
         return None
 
-    user = get_user_by_email(db, email)
+    user = _get_user_for_token(db, token, email)
+    if user:
+        request.state.user = user
     return user
 
 
@@ -118,7 +266,7 @@ def require_auth_for_web(current_user=Depends(get_current_user_for_web)):
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_303_SEE_OTHER,
-            headers={"Location": "/login-page"}
+            headers=_LOGIN_REDIRECT_HEADERS
         )
     return current_user
 
@@ -129,9 +277,14 @@ async def read_root(request: Request, db: Session = Depends(database.get_db)):
     current_user = await get_current_user_for_web(request, db)
 
     if current_user:
-        products_count = db.query(models.Product).filter(models.Product.user_id == current_user.id).count()
-        supplies_count = db.query(models.Supply).filter(models.Supply.user_id == current_user.id).count()
-        inventories_count = db.query(models.Inventory).filter(models.Inventory.user_id == current_user.id).count()
+        products_count, supplies_count, inventories_count = db.execute(select(
+            select(func.count()).select_from(models.Product)
+            .where(models.Product.user_id == current_user.id).scalar_subquery(),
+            select(func.count()).select_from(models.Supply)
+            .where(models.Supply.user_id == current_user.id).scalar_subquery(),
+            select(func.count()).select_from(models.Inventory)
+            .where(models.Inventory.user_id == current_user.id).scalar_subquery(),
+        )).one()
     else:
         products_count = 0
         supplies_count = 0
@@ -165,11 +318,11 @@ async def register_from_form(
 ):
     try:
         if len(password) < 6:
-            return RedirectResponse(url="/register-page?error=Password+must+be+at+least+6+characters", status_code=303)
+            return RedirectResponse(url=_REDIRECT_REGISTER_SHORT_PASSWORD, status_code=303)
 
-        existing_user = db.query(models.User).filter(models.User.email == email).first()
+        existing_user = db.scalar(select(models.User).where(models.User.email == email))
         if existing_user:
-            return RedirectResponse(url="/register-page?error=Email+already+registered", status_code=303)
+            return RedirectResponse(url=_REDIRECT_REGISTER_EMAIL_TAKEN, status_code=303)
 
         hashed_password = get_password_hash(password)
 
@@ -182,10 +335,10 @@ async def register_from_form(
         db.add(db_user)
         db.commit()
 
-        return RedirectResponse(url="/login-page?success=Registration+successful", status_code=303)
+        return RedirectResponse(url=_REDIRECT_REGISTER_OK, status_code=303)
 
     except Exception as e:
-        return RedirectResponse(url="/register-page?error=Registration+failed+try+again", status_code=303)
+        return RedirectResponse(url=_REDIRECT_REGISTER_FAILED, status_code=303)
 
 
 @app.post("/login")
@@ -196,18 +349,18 @@ async def login_from_form(
 ):
     user = authenticate_user(db, email, password)
     if not user:
-        return RedirectResponse(url="/login-page?error=Invalid+credentials", status_code=303)
+        return RedirectResponse(url=_REDIRECT_LOGIN_FAILED, status_code=303)
 
     access_token = create_access_token(data={"sub": user.email})
-    response = RedirectResponse(url="/?success=Login+successful", status_code=303)
-    response.set_cookie(key="access_token", value=access_token, httponly=True)
+    response = RedirectResponse(url=_REDIRECT_LOGIN_OK, status_code=303)
+    response.set_cookie(value=access_token, **_ACCESS_TOKEN_COOKIE)
     return response
 
 
 @app.post("/logout")
 async def logout():
-    response = RedirectResponse(url="/", status_code=303)
-    response.delete_cookie(key="access_token")
+    response = RedirectResponse(url=_REDIRECT_HOME, status_code=303)
+    response.delete_cookie(key=_ACCESS_TOKEN_COOKIE["key"])
     return response
 
 
@@ -225,42 +378,41 @@ async def login_for_access_token(
 ):
     user = authenticate_user(db, username, password)
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise auth_error("Incorrect username or password")
 
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.get("/products/", response_model=List[schemas.Product])
+@app.get("/products/", response_model=None, responses={200: {"model": List[schemas.Product]}})
+@cached_user_list("products")
 def read_products_api(
         skip: int = 0,
         limit: int = 100,
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    return db.query(models.Product).filter(
-        models.Product.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    rows = db.scalars(
+        select(models.Product)
+        .where(models.Product.user_id == current_user.id)
+        .offset(skip).limit(limit)
+    ).all()
+    items = ProductListAdapter.validate_python(rows, from_attributes=True)
+    return ORJSONResponse(ProductListAdapter.dump_python(items, mode="json"))
 
 
-@app.get("/products/{product_id}", response_model=schemas.Product)
+@app.get("/products/{product_id}", response_model=None, responses={200: {"model": schemas.Product}})
 def read_product_api(
         product_id: int,
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    product = db.query(models.Product).filter(
-        models.Product.id == product_id,
-        models.Product.user_id == current_user.id
-    ).first()
+    product = get_owned_object(db, models.Product, product_id, current_user.id)
 
     if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+        raise not_found("Product not found")
+    item = ProductAdapter.validate_python(product, from_attributes=True)
+    return ORJSONResponse(ProductAdapter.dump_python(item, mode="json"))
 
 
 @app.post("/products/", response_model=schemas.Product)
@@ -269,9 +421,10 @@ def create_product_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    db_product = models.Product(**product.dict(), user_id=current_user.id)
+    db_product = models.Product(**product.model_dump(), user_id=current_user.id)
     db.add(db_product)
     db.commit()
+    invalidate_user_lists(current_user.id, "products")
     db.refresh(db_product)
     return db_product
 
@@ -283,18 +436,16 @@ def update_product_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    db_product = db.query(models.Product).filter(
-        models.Product.id == product_id,
-        models.Product.user_id == current_user.id
-    ).first()
+    db_product = get_owned_object(db, models.Product, product_id, current_user.id)
 
     if db_product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
+        raise not_found("Product not found")
 
-    for key, value in product.dict().items():
+    for key, value in product.model_dump().items():
         setattr(db_product, key, value)
 
     db.commit()
+    invalidate_user_lists(current_user.id, "products")
     db.refresh(db_product)
     return db_product
 
@@ -305,29 +456,32 @@ def delete_product_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    db_product = db.query(models.Product).filter(
-        models.Product.id == product_id,
-        models.Product.user_id == current_user.id
-    ).first()
+    db_product = get_owned_object(db, models.Product, product_id, current_user.id)
 
     if db_product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
+        raise not_found("Product not found")
 
     db.delete(db_product)
     db.commit()
+    invalidate_user_lists(current_user.id, "products", "supplies")
     return {"message": "Product deleted successfully"}
 
 
-@app.get("/supplies/", response_model=List[schemas.Supply])
+@app.get("/supplies/", response_model=None, responses={200: {"model": List[schemas.Supply]}})
+@cached_user_list("supplies")
 def read_supplies_api(
         skip: int = 0,
         limit: int = 100,
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    return db.query(models.Supply).filter(
-        models.Supply.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    rows = db.scalars(
+        select(models.Supply)
+        .where(models.Supply.user_id == current_user.id)
+        .offset(skip).limit(limit)
+    ).all()
+    items = SupplyListAdapter.validate_python(rows, from_attributes=True)
+    return ORJSONResponse(SupplyListAdapter.dump_python(items, mode="json"))
 
 
 @app.post("/supplies/", response_model=schemas.Supply)
@@ -336,19 +490,20 @@ def create_supply_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    product = db.query(models.Product).filter(
-        models.Product.id == supply.product_id,
-        models.Product.user_id == current_user.id
-    ).first()
-
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    product_id = db.execute(
+        update(models.Product)
+        .where(models.Product.id == supply.product_id, models.Product.user_id == current_user.id)
+        .values(current_stock=models.Product.current_stock + supply.quantity)
+        .returning(models.Product.id)
+    ).scalar()
 
-    db_supply = models.Supply(**supply.dict(), user_id=current_user.id)
-    product.current_stock += supply.quantity
+    if product_id is None:
+        raise not_found("Product not found")
 
+    db_supply = models.Supply(**supply.model_dump(), user_id=current_user.id)
     db.add(db_supply)
     db.commit()
+    invalidate_user_lists(current_user.id, "products", "supplies")
     db.refresh(db_supply)
     return db_supply
 
@@ -359,37 +514,37 @@ def delete_supply_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    supply = db.query(models.Supply).filter(
-        models.Supply.id == supply_id,
-        models.Supply.user_id == current_user.id
-    ).first()
+    supply = get_owned_object(db, models.Supply, supply_id, current_user.id)
 
     if not supply:
-        raise HTTPException(status_code=404, detail="Supply not found")
+        raise not_found("Supply not found")
 
-    product = db.query(models.Product).filter(
-        models.Product.id == supply.product_id,
-        models.Product.user_id == current_user.id
-    ).first()
+    product = get_owned_object(db, models.Product, supply.product_id, current_user.id)
 
     if product:
         product.current_stock -= supply.quantity
 
     db.delete(supply)
     db.commit()
+    invalidate_user_lists(current_user.id, "products", "supplies")
     return {"message": "Supply deleted successfully"}
 
 
-@app.get("/inventories/", response_model=List[schemas.Inventory])
+@app.get("/inventories/", response_model=None, responses={200: {"model": List[schemas.Inventory]}})
+@cached_user_list("inventories")
 def read_inventories_api(
         skip: int = 0,
         limit: int = 100,
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    return db.query(models.Inventory).filter(
-        models.Inventory.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    rows = db.scalars(
+        select(models.Inventory)
+        .where(models.Inventory.user_id == current_user.id)
+        .offset(skip).limit(limit)
+    ).all()
+    items = InventoryListAdapter.validate_python(rows, from_attributes=True)
+    return ORJSONResponse(InventoryListAdapter.dump_python(items, mode="json"))
 
 
 @app.post("/inventories/", response_model=schemas.Inventory)
@@ -398,14 +553,15 @@ def create_inventory_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    moscow_time = datetime.now(moscow_tz)
+    moscow_time = datetime.now(MSK)
     db_inventory = models.Inventory(
-        **inventory.dict(),
+        **inventory.model_dump(),
         user_id=current_user.id,
         created_at=moscow_time
     )
     db.add(db_inventory)
     db.commit()
+    invalidate_user_lists(current_user.id, "inventories")
     db.refresh(db_inventory)
     return db_inventory
 
@@ -417,21 +573,19 @@ def update_inventory_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    db_inventory = db.query(models.Inventory).filter(
-        models.Inventory.id == inventory_id,
-        models.Inventory.user_id == current_user.id
-    ).first()
+    db_inventory = get_owned_object(db, models.Inventory, inventory_id, current_user.id)
 
     if db_inventory is None:
-        raise HTTPException(status_code=404, detail="Inventory not found")
+        raise not_found("Inventory not found")
 
-    update_data = inventory.dict(exclude_unset=True)
+    update_data = inventory.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_inventory, key, value)
 
-    db_inventory.updated_at = datetime.now(moscow_tz)
+    db_inventory.updated_at = datetime.now(MSK)
 
     db.commit()
+    invalidate_user_lists(current_user.id, "inventories")
     db.refresh(db_inventory)
     return db_inventory
 
@@ -442,16 +596,14 @@ def delete_inventory_api(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_api)
 ):
-    db_inventory = db.query(models.Inventory).filter(
-        models.Inventory.id == inventory_id,
-        models.Inventory.user_id == current_user.id
-    ).first()
+    db_inventory = get_owned_object(db, models.Inventory, inventory_id, current_user.id)
 
     if db_inventory is None:
-        raise HTTPException(status_code=404, detail="Inventory not found")
+        raise not_found("Inventory not found")
 
     db.delete(db_inventory)
     db.commit()
+    invalidate_user_lists(current_user.id, "inventories")
     return {"message": "Inventory deleted successfully"}
 
 
@@ -462,7 +614,7 @@ async def products_page(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    products = db.query(models.Product).filter(models.Product.user_id == current_user.id).all()
+    products = db.scalars(select(models.Product).where(models.Product.user_id == current_user.id)).all()
     return templates.TemplateResponse("products.html", {
         "request": request,
         "products": products,
@@ -476,8 +628,12 @@ async def supplies_page(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    supplies = db.query(models.Supply).filter(models.Supply.user_id == current_user.id).all()
-    products = db.query(models.Product).filter(models.Product.user_id == current_user.id).all()
+    supplies = db.scalars(
+        select(models.Supply)
+        .options(selectinload(models.Supply.product))
+        .where(models.Supply.user_id == current_user.id)
+    ).all()
+    products = db.scalars(select(models.Product).where(models.Product.user_id == current_user.id)).all()
     return templates.TemplateResponse("supplies.html", {
         "request": request,
         "supplies": supplies,
@@ -492,7 +648,7 @@ async def inventories_page(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    inventories = db.query(models.Inventory).filter(models.Inventory.user_id == current_user.id).all()
+    inventories = db.scalars(select(models.Inventory).where(models.Inventory.user_id == current_user.id)).all()
     return templates.TemplateResponse("inventories.html", {
         "request": request,
         "inventories": inventories,
@@ -512,9 +668,9 @@ async def create_product_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    existing_product = db.query(models.Product).filter(models.Product.sku == sku).first()
+    existing_product = db.scalar(select(models.Product).where(models.Product.sku == sku))
     if existing_product:
-        return RedirectResponse(url="/products-page?error=SKU+already+exists", status_code=303)
+        return RedirectResponse(url=_REDIRECT_PRODUCT_SKU_EXISTS, status_code=303)
 
     db_product = models.Product(
         name=name,
@@ -526,8 +682,9 @@ async def create_product_from_form(
     )
     db.add(db_product)
     db.commit()
+    invalidate_user_lists(current_user.id, "products")
 
-    return RedirectResponse(url="/products-page?success=Product+created", status_code=303)
+    return RedirectResponse(url=_REDIRECT_PRODUCT_CREATED, status_code=303)
 
 
 @app.post("/products/delete/{product_id}")
@@ -537,15 +694,13 @@ async def delete_product_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    product = db.query(models.Product).filter(
-        models.Product.id == product_id,
-        models.Product.user_id == current_user.id
-    ).first()
+    product = get_owned_object(db, models.Product, product_id, current_user.id)
     if product:
         db.delete(product)
         db.commit()
-        return RedirectResponse(url="/products-page?success=Product+deleted", status_code=303)
-    return RedirectResponse(url="/products-page?error=Product+not+found", status_code=303)
+        invalidate_user_lists(current_user.id, "products", "supplies")
+        return RedirectResponse(url=_REDIRECT_PRODUCT_DELETED, status_code=303)
+    return RedirectResponse(url=_REDIRECT_PRODUCT_NOT_FOUND, status_code=303)
 
 
 @app.post("/supplies/create")
@@ -557,14 +712,16 @@ async def create_supply_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    product = db.query(models.Product).filter(
-        models.Product.id == product_id,
-        models.Product.user_id == current_user.id
-    ).first()
-    if not product:
-        return RedirectResponse(url="/supplies-page?error=Product+not+found", status_code=303)
-
-    moscow_time = datetime.now(moscow_tz)
+    updated_id = db.execute(
+        update(models.Product)
+        .where(models.Product.id == product_id, models.Product.user_id == current_user.id)
+        .values(current_stock=models.Product.current_stock + quantity)
+        .returning(models.Product.id)
+    ).scalar()
+    if updated_id is None:
+        return RedirectResponse(url=_REDIRECT_SUPPLY_PRODUCT_NOT_FOUND, status_code=303)
+
+    moscow_time = datetime.now(MSK)
     db_supply = models.Supply(
         product_id=product_id,
         quantity=quantity,
@@ -572,12 +729,11 @@ async def create_supply_from_form(
         supply_date=moscow_time,
         user_id=current_user.id
     )
-    product.current_stock += quantity
-
     db.add(db_supply)
     db.commit()
+    invalidate_user_lists(current_user.id, "products", "supplies")
 
-    return RedirectResponse(url="/supplies-page?success=Supply+created", status_code=303)
+    return RedirectResponse(url=_REDIRECT_SUPPLY_CREATED, status_code=303)
 
 
 @app.post("/supplies/delete/{supply_id}")
@@ -587,26 +743,21 @@ async def delete_supply_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    supply = db.query(models.Supply).filter(
-        models.Supply.id == supply_id,
-        models.Supply.user_id == current_user.id
-    ).first()
+    supply = get_owned_object(db, models.Supply, supply_id, current_user.id)
 
     if not supply:
-        return RedirectResponse(url="/supplies-page?error=Поставка+не+найдена", status_code=303)
+        return RedirectResponse(url=_REDIRECT_SUPPLY_NOT_FOUND, status_code=303)
 
-    product = db.query(models.Product).filter(
-        models.Product.id == supply.product_id,
-        models.Product.user_id == current_user.id
-    ).first()
+    product = get_owned_object(db, models.Product, supply.product_id, current_user.id)
 
     if product:
         product.current_stock -= supply.quantity
 
     db.delete(supply)
     db.commit()
+    invalidate_user_lists(current_user.id, "products", "supplies")
 
-    return RedirectResponse(url="/supplies-page?success=Поставка+удалена", status_code=303)
+    return RedirectResponse(url=_REDIRECT_SUPPLY_DELETED, status_code=303)
 
 
 @app.post("/inventories/create")
@@ -617,7 +768,7 @@ async def create_inventory_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    moscow_time = datetime.now(moscow_tz)
+    moscow_time = datetime.now(MSK)
     db_inventory = models.Inventory(
         name=name,
         description=description,
@@ -626,8 +777,9 @@ async def create_inventory_from_form(
     )
     db.add(db_inventory)
     db.commit()
+    invalidate_user_lists(current_user.id, "inventories")
 
-    return RedirectResponse(url="/inventories-page?success=Инвентаризация+создана", status_code=303)
+    return RedirectResponse(url=_REDIRECT_INVENTORY_CREATED, status_code=303)
 
 
 @app.post("/inventories/update/{inventory_id}")
@@ -640,22 +792,20 @@ async def update_inventory_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    inventory = db.query(models.Inventory).filter(
-        models.Inventory.id == inventory_id,
-        models.Inventory.user_id == current_user.id
-    ).first()
+    inventory = get_owned_object(db, models.Inventory, inventory_id, current_user.id)
 
     if not inventory:
-        return RedirectResponse(url="/inventories-page?error=Инвентаризация+не+найдена", status_code=303)
+        return RedirectResponse(url=_REDIRECT_INVENTORY_NOT_FOUND_RU, status_code=303)
 
     inventory.name = name
     inventory.comment = comment
     inventory.is_successful = is_successful
-    inventory.updated_at = datetime.now(moscow_tz)
+    inventory.updated_at = datetime.now(MSK)
 
     db.commit()
+    invalidate_user_lists(current_user.id, "inventories")
 
-    return RedirectResponse(url="/inventories-page?success=Инвентаризация+обновлена", status_code=303)
+    return RedirectResponse(url=_REDIRECT_INVENTORY_UPDATED, status_code=303)
 
 
 @app.post("/inventories/update-status/{inventory_id}")
@@ -666,21 +816,19 @@ async def update_inventory_status(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    inventory = db.query(models.Inventory).filter(
-        models.Inventory.id == inventory_id,
-        models.Inventory.user_id == current_user.id
-    ).first()
+    inventory = get_owned_object(db, models.Inventory, inventory_id, current_user.id)
     if not inventory:
-        return RedirectResponse(url="/inventories-page?error=Inventory+not+found", status_code=303)
+        return RedirectResponse(url=_REDIRECT_INVENTORY_NOT_FOUND, status_code=303)
 
     valid_statuses = ["pending", "completed", "cancelled"]
     if status not in valid_statuses:
-        return RedirectResponse(url="/inventories-page?error=Invalid+status", status_code=303)
+        return RedirectResponse(url=_REDIRECT_INVENTORY_INVALID_STATUS, status_code=303)
 
     inventory.status = status
     db.commit()
+    invalidate_user_lists(current_user.id, "inventories")
 
-    return RedirectResponse(url="/inventories-page?success=Status+updated", status_code=303)
+    return RedirectResponse(url=_REDIRECT_INVENTORY_STATUS_UPDATED, status_code=303)
 
 
 @app.post("/inventories/delete/{inventory_id}")
@@ -690,20 +838,25 @@ async def delete_inventory_from_form(
         db: Session = Depends(database.get_db),
         current_user: models.User = Depends(require_auth_for_web)
 ):
-    inventory = db.query(models.Inventory).filter(
-        models.Inventory.id == inventory_id,
-        models.Inventory.user_id == current_user.id
-    ).first()
+    inventory = get_owned_object(db, models.Inventory, inventory_id, current_user.id)
     if inventory:
         db.delete(inventory)
         db.commit()
-        return RedirectResponse(url="/inventories-page?success=Inventory+deleted", status_code=303)
-    return RedirectResponse(url="/inventories-page?error=Inventory+not+found", status_code=303)
+        invalidate_user_lists(current_user.id, "inventories")
+        return RedirectResponse(url=_REDIRECT_INVENTORY_DELETED, status_code=303)
+    return RedirectResponse(url=_REDIRECT_INVENTORY_NOT_FOUND, status_code=303)
 
 
 
 from fastapi.openapi.utils import get_openapi
 
+_PUBLIC_ENDPOINTS = frozenset({
+    "/", "/login-page", "/register-page",
+    "/register", "/login", "/logout",
+    "/health", "/token", "/docs", "/openapi.json"
+})
+_BEARER_SECURITY = [{"BearerAuth": []}]
+
 
 def custom_openapi():
     if app.openapi_schema:
@@ -716,7 +869,7 @@ def custom_openapi():
         routes=app.routes,
     )
 
-    openapi_schema["components"]["securitySchemes"] = {
+    openapi_schema.setdefault("components", {})["securitySchemes"] = {
         "BearerAuth": {
             "type": "http",
             "scheme": "bearer",
@@ -724,18 +877,12 @@ def custom_openapi():
         }
     }
 
-    public_endpoints = [
-        "/", "/login-page", "/register-page",
-        "/register", "/login", "/logout",
-        "/health", "/token", "/docs", "/openapi.json"
-    ]
-
     for path, methods in openapi_schema["paths"].items():
-        if path in public_endpoints or path.endswith("-page"):
+        if path in _PUBLIC_ENDPOINTS or path.endswith("-page"):
             continue
 
-        for method_name, method in methods.items():
-            method["security"] = [{"BearerAuth": []}]
+        for method in methods.values():
+            method["security"] = _BEARER_SECURITY
 
     app.openapi_schema = openapi_schema
     return app.openapi_schema
@@ -743,11 +890,25 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+def create_tables():
+    models.Base.metadata.create_all(bind=database.engine)
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=database.engine, checkfirst=True)
+
+
 @app.on_event("startup")
 def startup_event():
+    # При нескольких воркерах схему создает один процесс: RUN_MIGRATIONS=0 для остальных
+    if os.environ.get("RUN_MIGRATIONS", "1") != "0":
+        create_tables()
+
+    app.openapi()
+
     db = database.SessionLocal()
     try:
-        if db.query(models.User).count() == 0:
+        if not db.scalar(select(exists().where(models.User.id.is_not(None)))):
             hashed_password = get_password_hash("admin123")
             user = models.User(
                 email="admin@warehouse.com",
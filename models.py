@@ -1,11 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 
-moscow_tz = pytz.timezone('Europe/Moscow')
+MSK = ZoneInfo('Europe/Moscow')
 
 class User(Base):
     __tablename__ = "users"
@@ -33,6 +33,8 @@ class Product(Base):
     user = relationship("User", back_populates="products")
     supplies = relationship("Supply", back_populates="product", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_products_user_id_id", "user_id", "id"),)
+
 
 class Supply(Base):
     __tablename__ = "supplies"
@@ -40,12 +42,14 @@ class Supply(Base):
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
     quantity = Column(Integer, nullable=False)
     supplier = Column(String, nullable=False)
-    supply_date = Column(DateTime(timezone=True), default=lambda: datetime.now(moscow_tz))
+    supply_date = Column(DateTime(timezone=True), default=lambda: datetime.now(MSK))
     status = Column(String, default="received")
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     product = relationship("Product", back_populates="supplies")
     user = relationship("User", back_populates="supplies")
 
+    __table_args__ = (Index("ix_supplies_user_id_id", "user_id", "id"),)
+
 
 class Inventory(Base):
     __tablename__ = "inventories"
@@ -55,7 +59,9 @@ class Inventory(Base):
     status = Column(String, default="pending")
     is_successful = Column(Boolean, default=False)
     comment = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(moscow_tz))
-    updated_at = Column(DateTime(timezone=True), onupdate=lambda: datetime.now(moscow_tz))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(MSK))
+    updated_at = Column(DateTime(timezone=True), onupdate=lambda: datetime.now(MSK))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    user = relationship("User", back_populates="inventories")
\ No newline at end of file
+    user = relationship("User", back_populates="inventories")
+
+    __table_args__ = (Index("ix_inventories_user_id_id", "user_id", "id"),)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, validator, field_validator, EmailStr
+from pydantic import BaseModel, field_validator, model_validator, EmailStr
 from typing import Optional, List
 from datetime import datetime
 
@@ -38,11 +38,11 @@ class ProductBase(BaseModel):
             raise ValueError('SKU cannot be empty')
         return v.strip()
 
-    @field_validator('min_stock', 'max_stock')
-    def validate_stock_values(cls, v, info):
-        if v < 0:
+    @model_validator(mode='after')
+    def validate_stock_values(self):
+        if self.min_stock < 0 or self.max_stock < 0:
             raise ValueError('Stock values cannot be negative')
-        return v
+        return self
 
 class ProductCreate(ProductBase):
     pass